@@ -1,14 +1,17 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
-import PyPDF2
-import requests
-import json
-import io
+import httpx
 import os
 import sys
 import subprocess
 import re
 
+from errors import error_text
+from pdf import extract_pdf
+
+# Platform is fixed for the life of the process
+_IS_MACOS = sys.platform == "darwin"
+
 __all__ = [
     'BaseAgent',
     'SpotlightAgent', 
@@ -16,24 +19,26 @@ __all__ = [
     'ResearchAgent',
     'AnalysisAgent',
     'MailAgent',
-    'CalendarAgent'
+    'CalendarAgent',
+    'close_http_client'
 ]
 
 class BaseAgent(ABC):
-    @abstractmethod
+    # Task types this agent accepts; a frozenset so can_handle is one hash lookup
+    TASK_TYPES: frozenset = frozenset()
+    
     def can_handle(self, task_type: str) -> bool:
-        pass
+        return task_type in self.TASK_TYPES
     
     @abstractmethod
     async def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
         pass
 
 class SpotlightAgent(BaseAgent):
-    def can_handle(self, task_type: str) -> bool:
-        return task_type == "spotlight_search"
+    TASK_TYPES = frozenset({"spotlight_search"})
 
     async def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
-        if sys.platform != "darwin":
+        if not _IS_MACOS:
             return {
                 "agent": "SpotlightAgent",
                 "status": "failed",
@@ -109,7 +114,7 @@ class SpotlightAgent(BaseAgent):
             return {
                 "agent": "SpotlightAgent",
                 "status": "error",
-                "results": {"error": str(e)},
+                "results": {"error": error_text(e)},
                 "summary": "An error occurred during the Spotlight search."
             }
 
@@ -121,8 +126,7 @@ class SpotlightAgent(BaseAgent):
         return None
 
 class FileAgent(BaseAgent):
-    def can_handle(self, task_type: str) -> bool:
-        return task_type in ["file_processing", "pdf_analysis", "document_extraction"]
+    TASK_TYPES = frozenset({"file_processing", "pdf_analysis", "document_extraction"})
     
     async def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
         files = task.get("files", [])
@@ -131,17 +135,14 @@ class FileAgent(BaseAgent):
         
         for file_data in files:
             try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_data["content"]))
-                full_text = ""
-                for page in pdf_reader.pages:
-                    full_text += page.extract_text() + "\n"
+                full_text, page_count = extract_pdf(file_data["content"])
                 
                 clean_text = self.clean_text(full_text)
                 analysis = await self.generate_detailed_analysis(clean_text, file_data["filename"], query)
                 
                 results.append({
                     "filename": file_data["filename"],
-                    "page_count": len(pdf_reader.pages),
+                    "page_count": page_count,
                     "word_count": len(clean_text.split()),
                     "character_count": len(clean_text),
                     "detailed_analysis": analysis,
@@ -150,7 +151,7 @@ class FileAgent(BaseAgent):
             except Exception as e:
                 results.append({
                     "filename": file_data["filename"],
-                    "error": str(e),
+                    "error": error_text(e),
                     "analysis": {"error": "Could not process this file format"}
                 })
         
@@ -490,14 +491,85 @@ class FileAgent(BaseAgent):
             "estimated_reading_time": f"{len(words) // 200} minutes"
         }
 
+# Shared by every ResearchAgent so searches reuse pooled keep-alive connections.
+# Built on first use and rebuilt after close_http_client(), so a host can
+# start and stop several times in one process (e.g. repeated test clients).
+_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+def _http_client() -> httpx.AsyncClient:
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=httpx.Timeout(10.0, connect=3.0)
+        )
+    return _HTTP_CLIENT
+
+async def close_http_client() -> None:
+    """Close the shared research client; an app hosting these agents awaits this on shutdown"""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is not None:
+        await _HTTP_CLIENT.aclose()
+        _HTTP_CLIENT = None
+
+# Fallback research data per query category; {query} is filled in per call.
+_FALLBACK_RESEARCH = {
+    "ai": (
+        (
+            "AI automation market projected to reach $35B by 2027 (relevant to: {query})",
+            "Enterprise adoption of AI workflows increased 340% in 2024 (context: {query})",
+            "Multi-agent systems showing 60% efficiency gains over single AI models (related: {query})"
+        ),
+        (
+            "https://marketsandmarkets.com/ai-automation-report",
+            "https://mckinsey.com/enterprise-ai-adoption-2024",
+            "https://arxiv.org/multi-agent-systems-efficiency"
+        )
+    ),
+    "competitor": (
+        (
+            "Market leader analysis shows fragmented landscape in {query} space",
+            "Top 3 competitors control 45% market share in {query} sector",
+            "Emerging players gaining traction with innovative approaches to {query}"
+        ),
+        (
+            "https://forrester.com/competitive-landscape-analysis",
+            "https://gartner.com/market-share-reports",
+            "https://techcrunch.com/startup-competitive-analysis"
+        )
+    ),
+    "default": (
+        (
+            "Industry research indicates strong growth potential in {query}",
+            "Expert analysis suggests {query} will be key differentiator by 2025",
+            "Strategic recommendations available for {query} implementation"
+        ),
+        (
+            "https://example-research.com/industry-analysis",
+            "https://example-insights.com/expert-opinions",
+            "https://example-strategy.com/recommendations"
+        )
+    )
+}
+
+_INSIGHT_PREFIXES = ("Research finding: ", "Market insight: ", "Competitive analysis: ", "Industry trend: ")
+
+def _insight_kind(query_lower: str) -> int:
+    if "market" in query_lower:
+        return 1
+    if "competitor" in query_lower:
+        return 2
+    if "trend" in query_lower:
+        return 3
+    return 0
+
 class ResearchAgent(BaseAgent):
+    TASK_TYPES = frozenset({"web_research", "competitor_analysis", "market_research", "safari_research"})
+    
     def __init__(self):
         self.search_api_key = os.environ.get("SERPER_API_KEY", "demo_key")
         self.search_url = "https://google.serper.dev/search"
     
-    def can_handle(self, task_type: str) -> bool:
-        return task_type in ["web_research", "competitor_analysis", "market_research", "safari_research"]
-    
     async def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
         query = task.get("query", "")
         task_type = task.get("task_type", "web_research")
@@ -509,7 +581,7 @@ class ResearchAgent(BaseAgent):
             search_results = await self.perform_web_search(query)
             return await self.process_search_results(query, search_results)
         except Exception as e:
-            return await self.enhanced_fallback_research(query, str(e))
+            return await self.enhanced_fallback_research(query, error_text(e))
     
     async def perform_web_search(self, query: str) -> Dict:
         if self.search_api_key == "demo_key":
@@ -527,7 +599,7 @@ class ResearchAgent(BaseAgent):
             'gl': 'us'
         }
         
-        response = requests.post(self.search_url, headers=headers, json=payload, timeout=10)
+        response = await _http_client().post(self.search_url, headers=headers, json=payload)
         
         if response.status_code == 200:
             return response.json()
@@ -540,6 +612,9 @@ class ResearchAgent(BaseAgent):
         detailed_results = []
         
         organic_results = search_data.get("organic", [])[:6]
+        query_lower = query.lower()
+        query_words = query_lower.split()
+        insight_prefix = _INSIGHT_PREFIXES[_insight_kind(query_lower)]
         
         for i, result in enumerate(organic_results):
             title = result.get("title", "")
@@ -547,16 +622,14 @@ class ResearchAgent(BaseAgent):
             link = result.get("link", "")
             
             if title and snippet:
-                insight = self.generate_insight(title, snippet, query)
-                
-                findings.append(insight)
+                findings.append(insight_prefix + snippet[:150] + "...")
                 sources.append(link)
                 detailed_results.append({
                     "rank": i + 1,
                     "title": title,
                     "snippet": snippet,
                     "url": link,
-                    "relevance_score": self.calculate_relevance(query, title + " " + snippet)
+                    "relevance_score": self.calculate_relevance(query, title + " " + snippet, query_words)
                 })
         
         related_searches = search_data.get("relatedSearches", [])
@@ -580,18 +653,9 @@ class ResearchAgent(BaseAgent):
             "summary": f"Found {len(findings)} live research insights for '{query}' from web search"
         }
     
-    def generate_insight(self, title: str, snippet: str, query: str) -> str:
-        if "market" in query.lower():
-            return f"Market insight: {snippet[:150]}..."
-        elif "competitor" in query.lower():
-            return f"Competitive analysis: {snippet[:150]}..."
-        elif "trend" in query.lower():
-            return f"Industry trend: {snippet[:150]}..."
-        else:
-            return f"Research finding: {snippet[:150]}..."
-    
-    def calculate_relevance(self, query: str, content: str) -> float:
-        query_words = query.lower().split()
+    def calculate_relevance(self, query: str, content: str, query_words: Optional[List[str]] = None) -> float:
+        if query_words is None:
+            query_words = query.lower().split()
         content_lower = content.lower()
         
         matches = sum(1 for word in query_words if word in content_lower)
@@ -628,39 +692,17 @@ class ResearchAgent(BaseAgent):
         }
     
     async def enhanced_fallback_research(self, query: str, error: str) -> Dict[str, Any]:
-        if "ai" in query.lower() or "automation" in query.lower():
-            findings = [
-                f"AI automation market projected to reach $35B by 2027 (relevant to: {query})",
-                f"Enterprise adoption of AI workflows increased 340% in 2024 (context: {query})",
-                f"Multi-agent systems showing 60% efficiency gains over single AI models (related: {query})"
-            ]
-            sources = [
-                "https://marketsandmarkets.com/ai-automation-report",
-                "https://mckinsey.com/enterprise-ai-adoption-2024", 
-                "https://arxiv.org/multi-agent-systems-efficiency"
-            ]
-        elif "competitor" in query.lower():
-            findings = [
-                f"Market leader analysis shows fragmented landscape in {query} space",
-                f"Top 3 competitors control 45% market share in {query} sector",
-                f"Emerging players gaining traction with innovative approaches to {query}"
-            ]
-            sources = [
-                "https://forrester.com/competitive-landscape-analysis",
-                "https://gartner.com/market-share-reports",
-                "https://techcrunch.com/startup-competitive-analysis"
-            ]
+        query_lower = query.lower()
+        if "ai" in query_lower or "automation" in query_lower:
+            category = "ai"
+        elif "competitor" in query_lower:
+            category = "competitor"
         else:
-            findings = [
-                f"Industry research indicates strong growth potential in {query}",
-                f"Expert analysis suggests {query} will be key differentiator by 2025",
-                f"Strategic recommendations available for {query} implementation"
-            ]
-            sources = [
-                "https://example-research.com/industry-analysis",
-                "https://example-insights.com/expert-opinions",
-                "https://example-strategy.com/recommendations"
-            ]
+            category = "default"
+
+        templates, sources = _FALLBACK_RESEARCH[category]
+        findings = [template.format(query=query) for template in templates]
+        sources = list(sources)
         
         return {
             "agent": "ResearchAgent",
@@ -678,8 +720,7 @@ class ResearchAgent(BaseAgent):
         }
 
 class AnalysisAgent(BaseAgent):
-    def can_handle(self, task_type: str) -> bool:
-        return task_type in ["analysis", "insights", "summary", "report_generation"]
+    TASK_TYPES = frozenset({"analysis", "insights", "summary", "report_generation"})
     
     async def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
         data = task.get("data", {})
@@ -708,18 +749,18 @@ class AnalysisAgent(BaseAgent):
         }
 
 class MailAgent(BaseAgent):
-    def can_handle(self, task_type: str) -> bool:
-        return task_type in ["email_analysis", "draft_email", "schedule_email", "email_insights", "extract_action_items"]
+    TASK_TYPES = frozenset({"email_analysis", "draft_email", "schedule_email", "email_insights", "extract_action_items"})
     
     async def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
         query = task.get("query", "")
         task_type = task.get("task_type", "")
+        query_lower = query.lower()
         
-        if "draft" in query.lower() or task_type == "draft_email":
+        if "draft" in query_lower or task_type == "draft_email":
             result = await self.draft_email(query)
-        elif "action" in query.lower() or "todo" in query.lower():
+        elif "action" in query_lower or "todo" in query_lower:
             result = await self.extract_action_items(query)
-        elif "schedule" in query.lower():
+        elif "schedule" in query_lower:
             result = await self.schedule_email(query)
         else:
             result = await self.analyze_emails(query)
@@ -792,21 +833,83 @@ class MailAgent(BaseAgent):
             ]
         }
 
+# Working hours and demo calendar, in minutes since midnight.
+_WORKDAY = (9 * 60, 18 * 60)
+
+# Days offered for new bookings; Today's calendar is only reported as busy time
+_BOOKABLE_DAYS = ("Tomorrow", "Friday")
+
+# "30 min", "1 hour", "2 hrs" ... in an availability query; default slot is 30 minutes
+_DURATION_RE = re.compile(r"(\d+)\s*(min|minute|hr|hour)s?\b")
+
+_DEMO_CALENDAR = {
+    "Today": [
+        (10 * 60, 12 * 60, "Team Meeting")
+    ],
+    "Tomorrow": [
+        (10 * 60, 11 * 60, "Design Review"),
+        (11 * 60, 13 * 60, "Client Call"),
+        (13 * 60, 14 * 60, "Lunch"),
+        (16 * 60, 17 * 60, "1:1 Sync")
+    ],
+    "Friday": [
+        (9 * 60, 10 * 60, "Weekly Planning"),
+        (12 * 60, 13 * 60, "Lunch"),
+        (15 * 60, 18 * 60, "Quarterly Review")
+    ]
+}
+
+def _merge_busy(events: List[tuple]) -> List[tuple]:
+    merged = []
+    for start, end, _ in sorted(events):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+# The demo calendar is static, so busy blocks are sorted and merged once at import.
+_MERGED_BUSY = {day: _merge_busy(events) for day, events in _DEMO_CALENDAR.items()}
+
+def _free_slots(busy: List[tuple], day_start: int, day_end: int, min_minutes: int = 30) -> List[tuple]:
+    slots = []
+    cursor = day_start
+    for start, end in busy:
+        if start >= day_end:
+            break
+        if start - cursor >= min_minutes:
+            slots.append((cursor, start))
+        cursor = max(cursor, end)
+    if day_end - cursor >= min_minutes:
+        slots.append((cursor, day_end))
+    return slots
+
+def _requested_minutes(query_lower: str, default: int = 30) -> int:
+    match = _DURATION_RE.search(query_lower)
+    if not match:
+        return default
+    amount = max(int(match.group(1)), 1)
+    return amount * 60 if match.group(2) in ("hr", "hour") else amount
+
+def _format_minutes(minutes: int) -> str:
+    hour, minute = divmod(minutes, 60)
+    return f"{(hour - 1) % 12 + 1}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
 class CalendarAgent(BaseAgent):
-    def can_handle(self, task_type: str) -> bool:
-        return task_type in ["schedule_meeting", "find_availability", "meeting_prep", "calendar_insights", "time_blocking"]
+    TASK_TYPES = frozenset({"schedule_meeting", "find_availability", "meeting_prep", "calendar_insights", "time_blocking"})
     
     async def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
         query = task.get("query", "")
         task_type = task.get("task_type", "")
+        query_lower = query.lower()
         
-        if "schedule" in query.lower() or "meeting" in query.lower():
+        if "schedule" in query_lower or "meeting" in query_lower:
             result = await self.schedule_meeting(query)
-        elif "available" in query.lower() or "free" in query.lower():
+        elif "available" in query_lower or "free" in query_lower:
             result = await self.find_availability(query)
-        elif "prepare" in query.lower() or "prep" in query.lower():
+        elif "prepare" in query_lower or "prep" in query_lower:
             result = await self.meeting_prep(query)
-        elif "block" in query.lower() or "focus" in query.lower():
+        elif "block" in query_lower or "focus" in query_lower:
             result = await self.time_blocking(query)
         else:
             result = await self.calendar_insights(query)
@@ -842,27 +945,38 @@ class CalendarAgent(BaseAgent):
         }
     
     async def find_availability(self, query: str) -> Dict[str, Any]:
+        available_slots = []
+        busy_periods = []
+        best_slot = None
+        min_minutes = _requested_minutes(query.lower())
+
+        for day in _BOOKABLE_DAYS:
+            slots = _free_slots(_MERGED_BUSY[day], *_WORKDAY, min_minutes=min_minutes)
+            if slots:
+                available_slots.append({
+                    "date": day,
+                    "times": [f"{_format_minutes(s)} - {_format_minutes(e)}" for s, e in slots]
+                })
+            for start, end in slots:
+                if best_slot is None or end - start > best_slot[2] - best_slot[1]:
+                    best_slot = (day, start, end)
+        for day, events in _DEMO_CALENDAR.items():
+            for start, end, title in events:
+                busy_periods.append(f"{day} {_format_minutes(start)} - {_format_minutes(end)} ({title})")
+
+        recommendations = [
+            "Optimal meeting slots: Friday morning",
+            "Avoid scheduling during lunch hours"
+        ]
+        if best_slot:
+            day, start, end = best_slot
+            recommendations.insert(0, f"Best time for focused work: {day} {_format_minutes(start)} - {_format_minutes(end)}")
+
         return {
             "action": "find_availability",
-            "available_slots": [
-                {
-                    "date": "Tomorrow",
-                    "times": ["9:00 AM - 10:00 AM", "2:00 PM - 4:00 PM", "5:00 PM - 6:00 PM"]
-                },
-                {
-                    "date": "Friday",
-                    "times": ["10:00 AM - 12:00 PM", "1:00 PM - 3:00 PM"]
-                }
-            ],
-            "busy_periods": [
-                "Today 10:00 AM - 12:00 PM (Team Meeting)",
-                "Tomorrow 11:00 AM - 1:00 PM (Client Call)"
-            ],
-            "recommendations": [
-                "Best time for focused work: Tomorrow 2:00 PM - 4:00 PM",
-                "Optimal meeting slots: Friday morning",
-                "Avoid scheduling during lunch hours"
-            ]
+            "available_slots": available_slots,
+            "busy_periods": busy_periods,
+            "recommendations": recommendations
         }
     
     async def meeting_prep(self, query: str) -> Dict[str, Any]:
@@ -0,0 +1,8 @@
+# Longest exception text echoed back in a result; PDF parser and HTTP errors
+# can carry kilobytes of payload that has no place in a JSON response.
+MAX_ERROR_CHARS = 256
+
+
+def error_text(exc: Exception) -> str:
+    """Exception message capped for embedding in a result"""
+    return str(exc)[:MAX_ERROR_CHARS]
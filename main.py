@@ -1,19 +1,44 @@
 # main.py  —  entire file, drop-in replacement
 import os
 import asyncio
-import json
+import hashlib
+import io
+import re
+import time
 import httpx
-from datetime import datetime
-from typing import List, Dict, Any
+import orjson
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple
 
-from fastapi import FastAPI, Form, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Form, UploadFile, File, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from openai import AsyncOpenAI
 
+from errors import error_text
+
 # -------------------------------------------------
 # FastAPI app
 # -------------------------------------------------
-app = FastAPI(title="Apple AI Orchestrator 2.0")
+# One pooled client for all Serper calls, so requests reuse keep-alive connections.
+# Opened on startup and closed on shutdown, so each app run gets a live client.
+SERPER_CLIENT: Optional[httpx.AsyncClient] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global SERPER_CLIENT
+    SERPER_CLIENT = httpx.AsyncClient(
+        base_url="https://google.serper.dev",
+        headers={"X-API-KEY": SERPER_API_KEY or "", "Content-Type": "application/json"},
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=10.0,
+    )
+    try:
+        yield
+    finally:
+        await SERPER_CLIENT.aclose()
+
+app = FastAPI(title="Apple AI Orchestrator 2.0", lifespan=lifespan)
 
 # -------------------------------------------------
 # Environment keys
@@ -30,13 +55,9 @@ async def research_agent(query: str) -> Dict[str, Any]:
     if not SERPER_API_KEY:
         return {"summary": "No SERPER_API_KEY configured."}
 
-    payload = {"q": query, "num": 5}
-    headers = {"X-API-KEY": SERPER_API_KEY, "Content-Type": "application/json"}
-
-    async with httpx.AsyncClient() as http:
-        r = await http.post("https://google.serper.dev/search", json=payload, headers=headers)
-        r.raise_for_status()
-        data = r.json()
+    r = await SERPER_CLIENT.post("/search", json={"q": query, "num": 5})
+    r.raise_for_status()
+    data = r.json()
 
     organic = data.get("organic", [])
     summary = "\n".join([f"{i+1}. {o['title']} ({o['link']})" for i, o in enumerate(organic[:3])])
@@ -69,38 +90,90 @@ AGENTS = {
     "calendar_agent": calendar_agent,
 }
 
+# Every agent behind one (query, files) signature, so dispatch needs no name checks
+AGENT_DISPATCH = {
+    "file_agent": file_agent,
+    "research_agent": lambda q, f: research_agent(q),
+    "analysis_agent": lambda q, f: analysis_agent(q),
+    "mail_agent": lambda q, f: mail_agent(q),
+    "calendar_agent": lambda q, f: calendar_agent(q),
+}
+
+# Static per-agent "results" payloads, shared read-only across responses
+DETAILS = {name: {"details": f"Detailed output from {name}"} for name in AGENTS}
+
+# Routing keywords, matched in one regex pass over the lowercased query
+KEYWORD_AGENTS = {
+    "meeting": ("calendar_agent", "mail_agent"),
+    "schedule": ("calendar_agent", "mail_agent"),
+    "calendar": ("calendar_agent", "mail_agent"),
+    "research": ("research_agent",),
+    "market": ("research_agent",),
+    "competitive": ("research_agent",),
+}
+KEYWORD_RE = re.compile("|".join(KEYWORD_AGENTS))
+ROUTED_ORDER = ("calendar_agent", "mail_agent", "research_agent")
+
 # -------------------------------------------------
-# /execute endpoint
+# Response cache for file-less /execute calls
 # -------------------------------------------------
-@app.post("/execute")
-async def execute(
-    query: str = Form(...),
-    files: List[UploadFile] = File([])
-):
-    start = datetime.utcnow()
+# Per process and in memory only: cached research summaries stay as they were
+# until evicted or the server restarts. EXECUTE_CACHE_SIZE=0 disables it.
+# Only runs made up entirely of read-only agents are cached; replaying a
+# calendar or mail agent would report an action that never happened.
+EXECUTE_CACHE_SIZE = int(os.getenv("EXECUTE_CACHE_SIZE", "512"))
+CACHEABLE_AGENTS = frozenset({"analysis_agent", "research_agent"})
+_execute_cache: "OrderedDict[str, Tuple[List[str], List[Dict[str, Any]]]]" = OrderedDict()
+
+def route_agents(query: str, files: List[UploadFile]) -> List[str]:
     to_run = ["analysis_agent"]
     if files:
         to_run.insert(0, "file_agent")
-    if any(k in query.lower() for k in ("meeting", "schedule", "calendar")):
-        to_run.extend(["calendar_agent", "mail_agent"])
-    if any(k in query.lower() for k in ("research", "market", "competitive")):
-        to_run.append("research_agent")
-
-    coros = [
-        AGENTS[name](query, files) if name == "file_agent" else AGENTS[name](query)
-        for name in to_run
-    ]
-    results = await asyncio.gather(*coros)
+    routed = {name for k in KEYWORD_RE.findall(query.lower()) for name in KEYWORD_AGENTS[k]}
+    to_run.extend(name for name in ROUTED_ORDER if name in routed)
+    return to_run
+
+async def run_agents(query: str, files: List[UploadFile]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    to_run = route_agents(query, files)
+
+    if len(to_run) == 1:
+        # Lone agent: await it directly rather than paying for a task group
+        results = [await AGENT_DISPATCH[to_run[0]](query, files)]
+    else:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(AGENT_DISPATCH[name](query, files)) for name in to_run]
+        results = [t.result() for t in tasks]
 
     agent_results = [
         {
             "agent": name,
             "status": "success",
             "summary": res["summary"],
-            "results": {"details": f"Detailed output from {name}"}
+            "results": DETAILS[name]
         }
         for name, res in zip(to_run, results)
     ]
+    return to_run, agent_results
+
+# -------------------------------------------------
+# /execute endpoint
+# -------------------------------------------------
+@app.post("/execute", response_class=ORJSONResponse)
+async def execute(
+    query: str = Form(...),
+    files: List[UploadFile] = File([])
+):
+    start = time.perf_counter()
+    cached = None if files else _execute_cache.get(query)
+    if cached is not None:
+        _execute_cache.move_to_end(query)
+        to_run, agent_results = cached
+    else:
+        to_run, agent_results = await run_agents(query, files)
+        if not files and EXECUTE_CACHE_SIZE > 0 and CACHEABLE_AGENTS.issuperset(to_run):
+            _execute_cache[query] = (to_run, agent_results)
+            if len(_execute_cache) > EXECUTE_CACHE_SIZE:
+                _execute_cache.popitem(last=False)
 
     return {
         "success": True,
@@ -111,19 +184,88 @@ async def execute(
             "summary": "Multi-agent orchestration finished successfully",
             "agent_results": agent_results,
             "orchestration_metadata": {
-                "duration_sec": (datetime.utcnow() - start).total_seconds(),
+                "duration_sec": time.perf_counter() - start,
                 "total_agents": len(to_run),
                 "files_processed": len(files)
             }
         }
     }
 
+# -------------------------------------------------
+# /execute/stream endpoint (NDJSON, one line per agent as it finishes)
+# -------------------------------------------------
+@app.post("/execute/stream")
+async def execute_stream(
+    query: str = Form(...),
+    files: List[UploadFile] = File([])
+):
+    start = time.perf_counter()
+    to_run = route_agents(query, files)
+
+    # FastAPI closes the form's uploads once this handler returns, before the
+    # agents run inside events(), so hand them in-memory copies instead
+    files = [
+        UploadFile(io.BytesIO(await f.read()), size=f.size, filename=f.filename, headers=f.headers)
+        for f in files
+    ]
+
+    # Filled in place by slot index, so results stay in routing order
+    agent_results: List[Any] = [None] * len(to_run)
+
+    async def run(index: int) -> int:
+        name = to_run[index]
+        try:
+            res = await AGENT_DISPATCH[name](query, files)
+            agent_results[index] = {"agent": name, "status": "success", "summary": res["summary"], "results": DETAILS[name]}
+        except Exception as e:
+            agent_results[index] = {"agent": name, "status": "error", "summary": error_text(e), "results": None}
+        return index
+
+    async def events():
+        tasks = [asyncio.create_task(run(index)) for index in range(len(to_run))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index = await next_done
+                yield orjson.dumps({"agent_result": agent_results[index]}) + b"\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+
+        failed = [r["agent"] for r in agent_results if r["status"] == "error"]
+        if not failed:
+            status, summary = "completed", "Multi-agent orchestration finished successfully"
+        elif len(failed) < len(to_run):
+            status, summary = "partial", f"Multi-agent orchestration finished with errors from: {', '.join(failed)}"
+        else:
+            status, summary = "error", "All agents failed"
+
+        yield orjson.dumps({
+            "success": status != "error",
+            **({"error": summary} if status == "error" else {}),
+            "data": {
+                "query": query,
+                "agents_executed": to_run,
+                "status": status,
+                "summary": summary,
+                "agent_results": agent_results,
+                "orchestration_metadata": {
+                    "duration_sec": time.perf_counter() - start,
+                    "total_agents": len(to_run),
+                    "files_processed": len(files)
+                }
+            }
+        }) + b"\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 # -------------------------------------------------
 # Serve front-end
 # -------------------------------------------------
 @app.get("/", response_class=HTMLResponse)
-def index():
-    return HTMLResponse(content=INDEX_HTML)
+def index(request: Request):
+    if request.headers.get("if-none-match") == INDEX_ETAG:
+        return Response(status_code=304, headers=INDEX_HEADERS)
+    return HTMLResponse(content=INDEX_BYTES, headers=INDEX_HEADERS)
 
 INDEX_HTML = """<!doctype html>
 <html lang="en">
@@ -216,10 +358,30 @@ async function executeOrchestration(){
  const fd=new FormData();fd.append('query',q);
  [...document.getElementById('fileInput').files].forEach(f=>fd.append('files',f));
  try{
-  const r=await fetch('/execute',{method:'POST',body:fd});
-  const d=await r.json();
-  if(!d.success) throw new Error(d.error||'Unknown');
-  document.getElementById('finalResults').innerHTML='<pre style="white-space:pre-wrap">'+JSON.stringify(d.data,null,2)+'</pre>';
+  const r=await fetch('/execute/stream',{method:'POST',body:fd});
+  if(!r.ok) throw new Error('HTTP '+r.status);
+  const reader=r.body.getReader(),dec=new TextDecoder();
+  let buf='',d=null;
+  const handle=line=>{
+   if(!line.trim()) return;
+   const m=JSON.parse(line);
+   if(m.agent_result){
+    const s=document.createElement('div');s.className='agent-step';
+    s.textContent=(m.agent_result.status==='success'?'✅ ':'❌ ')+m.agent_result.agent+': '+m.agent_result.summary;
+    document.getElementById('agentProgress').appendChild(s);
+   }else d=m;
+  };
+  for(;;){
+   const {done,value}=await reader.read();
+   if(done) break;
+   buf+=dec.decode(value,{stream:true});
+   const lines=buf.split('\\n');buf=lines.pop();
+   lines.forEach(handle);
+  }
+  handle(buf);
+  if(!d||!d.success) throw new Error((d&&d.error)||'Unknown');
+  const warn=d.data.status==='completed'?'':'<div class="result-section" style="border-color:#ff9800"><h4>⚠️ Partial result</h4><p>'+d.data.summary+'</p></div>';
+  document.getElementById('finalResults').innerHTML=warn+'<pre style="white-space:pre-wrap">'+JSON.stringify(d.data,null,2)+'</pre>';
  }catch(e){
   document.getElementById('finalResults').innerHTML='<div class="result-section" style="border-color:#f44336"><h4>❌ Error</h4><p>'+e.message+'</p></div>';
  }finally{btn.textContent='🚀 Execute Orchestration';btn.disabled=false;}
@@ -227,3 +389,23 @@ async function executeOrchestration(){
 </script>
 </body>
 </html>"""
+
+# Encoded once at import so GET / never re-encodes or re-hashes the page
+INDEX_BYTES = INDEX_HTML.encode("utf-8")
+INDEX_ETAG = '"' + hashlib.sha1(INDEX_BYTES).hexdigest() + '"'
+INDEX_HEADERS = {"ETag": INDEX_ETAG, "Cache-Control": "public, max-age=3600"}
+
+# -------------------------------------------------
+# Entry point: one uvloop/httptools worker process per CPU core by default.
+# Workers share nothing, so the /execute response cache is per worker.
+# -------------------------------------------------
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+    )
@@ -1,12 +1,132 @@
-from typing import Dict, Any, List, Union
+from typing import Dict, Any, List, Optional, Union
 import asyncio
-from datetime import datetime
-import PyPDF2
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import logging
+import multiprocessing
+import os
+import re
+import time
+import weakref
+
+from errors import error_text
+from pdf import extract_pdf
+
+
+# Routing keywords per task type, each compiled once into a single alternation
+_RESEARCH_RE = re.compile("|".join(map(re.escape, ("research", "find", "search", "look up"))))
+_ANALYZE_RE = re.compile("|".join(map(re.escape, ("analyze", "summarize", "summary"))))
+_FILE_RE = re.compile("|".join(map(re.escape, ("pdf", "file", "document"))))
+
+# PDFs at least this large are parsed in a worker process, each with its own
+# PDFium, so big documents parse in parallel. Smaller ones run in a thread,
+# where PDFium calls are serialized but nothing has to be pickled across.
+_PDF_PROCESS_MIN_BYTES = 1024 * 1024
+_PDF_POOL = None
+
+# Cap on PDF extractions in flight, shared by every orchestrator, so upload
+# bursts queue here instead of piling up in the thread and process pools.
+# asyncio primitives belong to one event loop, so each running loop gets its
+# own gate; a server runs a single loop per worker, which makes it process-wide.
+_PDF_CONCURRENCY = int(os.environ.get("PDF_CONCURRENCY", "4"))
+if _PDF_CONCURRENCY < 1:
+    raise ValueError(f"PDF_CONCURRENCY must be at least 1, got {_PDF_CONCURRENCY}")
+_PDF_GATES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+logger = logging.getLogger(__name__)
+
+# One routing decision, kept in memory for later analysis. route_ns covers the
+# classification alone, latency_ns the whole orchestration; cache_hit is None
+# when uploaded files bypass the intent cache.
+RouteEvent = namedtuple(
+    "RouteEvent",
+    ["task_type", "agents_executed", "status", "cache_hit", "route_ns", "latency_ns"]
+)
+
+
+def _normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so equivalent queries share a cache entry"""
+    return " ".join((query or "").lower().split())
+
+
+def _extract_pdf_text(file_path: str) -> str:
+    """Blocking text extraction for one PDF; run off the event loop"""
+    with open(file_path, 'rb') as pdf_file:
+        text, _ = extract_pdf(pdf_file.read())
+    return text.strip()
+
+
+def _pdf_gate() -> asyncio.Semaphore:
+    """Extraction gate for the running event loop, created on its first PDF"""
+    loop = asyncio.get_running_loop()
+    gate = _PDF_GATES.get(loop)
+    if gate is None:
+        gate = _PDF_GATES[loop] = asyncio.Semaphore(_PDF_CONCURRENCY)
+    return gate
+
+
+def _pdf_pool() -> ProcessPoolExecutor:
+    """Process pool for large PDFs, created on first use rather than at import"""
+    global _PDF_POOL
+    if _PDF_POOL is None:
+        # forkserver (spawn where unavailable), not fork: by now this process has
+        # event-loop and to_thread workers, and forking a multi-threaded process
+        # can deadlock the child. The extraction gate never lets more than
+        # _PDF_CONCURRENCY jobs in, so size the pool to that.
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _PDF_POOL = ProcessPoolExecutor(
+            max_workers=_PDF_CONCURRENCY,
+            mp_context=multiprocessing.get_context(start_method)
+        )
+    return _PDF_POOL
+
+
+async def _extract_pdf_text_async(file_path: str) -> str:
+    """Extract one PDF off the event loop, picking a process or thread by file size"""
+    try:
+        large = os.path.getsize(file_path) >= _PDF_PROCESS_MIN_BYTES
+    except OSError:
+        large = False  # let the extraction itself report the failure
+    async with _pdf_gate():
+        if large:
+            return await asyncio.get_running_loop().run_in_executor(_pdf_pool(), _extract_pdf_text, file_path)
+        return await asyncio.to_thread(_extract_pdf_text, file_path)
+
+
+@lru_cache(maxsize=1024)
+def _classify_query(query_lower: str) -> str:
+    """Task type for a normalized query without files, cached per query"""
+    # Check for research
+    if _RESEARCH_RE.search(query_lower):
+        return "research"
+    
+    # Check for analysis
+    if _ANALYZE_RE.search(query_lower):
+        if _FILE_RE.search(query_lower):
+            return "need_file"
+        return "analyze"
+    
+    # Default: more than five words reads as text to analyze; stop splitting at the sixth
+    return "analyze" if len(query_lower.split(maxsplit=5)) > 5 else "unclear"
 
 
 class MultiAgentOrchestrator:
     """Simple orchestrator that routes tasks to appropriate agents"""
     
+    def __init__(self, max_route_events: int = 10_000):
+        # Ring buffer of recent routing decisions, oldest dropped first
+        self._route_events = deque(maxlen=max_route_events)
+    
+    def get_route_events(self) -> List[RouteEvent]:
+        """Snapshot of recorded routing decisions, oldest first"""
+        return list(self._route_events)
+    
+    @classmethod
+    def clear_intent_cache(cls) -> None:
+        """Drop cached task-type classifications"""
+        _classify_query.cache_clear()
+    
     async def process_file(self, files: List[str]) -> Dict[str, Any]:
         """Process PDF files and extract text"""
         if not files:
@@ -15,21 +135,17 @@ class MultiAgentOrchestrator:
                 "summary": "No files provided"
             }
         
-        all_text = []
-        for file_path in files:
-            try:
-                with open(file_path, 'rb') as pdf_file:
-                    reader = PyPDF2.PdfReader(pdf_file)
-                    text = ""
-                    for page in reader.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                    all_text.append(text.strip())
-            except Exception as e:
+        # Extract all files concurrently off the event loop; the first failure
+        # in input order still decides the error, as with the serial loop
+        all_text = await asyncio.gather(
+            *(_extract_pdf_text_async(file_path) for file_path in files),
+            return_exceptions=True
+        )
+        for text in all_text:
+            if isinstance(text, Exception):
                 return {
                     "status": "error",
-                    "summary": f"Failed to read PDF: {str(e)}"
+                    "summary": f"Failed to read PDF: {error_text(text)}"
                 }
         
         combined_text = "\n\n".join(all_text)
@@ -76,32 +192,85 @@ class MultiAgentOrchestrator:
             ]
         }
     
-    def determine_task_type(self, query: str, has_files: bool) -> str:
+    def determine_task_type(self, query: str, has_files: bool, query_lower: Optional[str] = None) -> str:
         """Simple task type detection"""
-        if not query:
-            query = ""
-        
-        query_lower = query.lower()
-        
         # Check for file processing
         if has_files:
             return "file_and_analyze"
         
-        # Check for research
-        if any(word in query_lower for word in ["research", "find", "search", "look up"]):
-            return "research"
+        if query_lower is None:
+            query_lower = _normalize_query(query)
+        return _classify_query(query_lower)
+    
+    async def _file_and_analyze(self, query: str, query_lower: str, files: Any) -> Dict[str, Any]:
+        # Process file first
+        file_result = await self.process_file(files)
+        if file_result["status"] == "error":
+            return {
+                "status": "error",
+                "summary": file_result["summary"],
+                "query": query,
+                "agents_executed": ["file"]
+            }
         
-        # Check for analysis
-        if any(word in query_lower for word in ["analyze", "summarize", "summary"]):
-            if "pdf" in query_lower or "file" in query_lower or "document" in query_lower:
-                return "need_file"
-            return "analyze"
+        # Then analyze the extracted text
+        analysis_result = await self.analyze_text(file_result["extracted_text"])
+        return {
+            "status": "completed",
+            "summary": f"{file_result['summary']}. {analysis_result['summary']}",
+            "query": query,
+            "agents_executed": ["file", "analysis"]
+        }
+    
+    async def _research(self, query: str, query_lower: str, files: Any) -> Dict[str, Any]:
+        # Do research
+        research_result = await self.research_topic(query)
+        
+        # If they want a report, add analysis
+        if "report" in query_lower or "analysis" in query_lower:
+            findings_text = "\n".join(research_result.get("findings", []))
+            await self.analyze_text(f"{query}\n\nFindings:\n{findings_text}")
+            return {
+                "status": "completed",
+                "summary": f"{research_result['summary']}. Created analysis report.",
+                "query": query,
+                "agents_executed": ["research", "analysis"]
+            }
         
-        # Default
-        return "analyze" if len(query.split()) > 5 else "unclear"
+        return {
+            "status": "completed",
+            "summary": research_result["summary"],
+            "query": query,
+            "agents_executed": ["research"]
+        }
+    
+    async def _analyze(self, query: str, query_lower: str, files: Any) -> Dict[str, Any]:
+        # Direct text analysis
+        analysis_result = await self.analyze_text(query)
+        return {
+            "status": "completed",
+            "summary": analysis_result["summary"],
+            "query": query,
+            "agents_executed": ["analysis"]
+        }
+    
+    # Task type -> handler, built once with the class
+    _HANDLERS = {
+        "file_and_analyze": _file_and_analyze,
+        "research": _research,
+        "analyze": _analyze
+    }
+    
+    # Task types answered with a fixed error summary and no agent work
+    _ERROR_SUMMARIES = {
+        "need_file": "You mentioned a file but didn't upload any. Please attach a file.",
+        "unclear": "I couldn't understand your request. Please provide more details."
+    }
     
     async def execute_orchestration(self, task: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
         """Main orchestration method"""
+        started = time.perf_counter_ns()
+        
         # Normalize input
         if isinstance(task, str):
             query = task
@@ -109,86 +278,37 @@ class MultiAgentOrchestrator:
         else:
             query = task.get("query", "")
             files = task.get("files")
+        query_lower = _normalize_query(query)
         
         # Determine what to do
-        task_type = self.determine_task_type(query, bool(files))
+        hits_before = None if files else _classify_query.cache_info().hits
+        task_type = self.determine_task_type(query, bool(files), query_lower)
+        routed = time.perf_counter_ns()
+        cache_hit = None if files else _classify_query.cache_info().hits > hits_before
         
-        # Handle different task types
-        if task_type == "need_file":
-            return {
-                "status": "error",
-                "summary": "You mentioned a file but didn't upload any. Please attach a file.",
-                "query": query,
-                "agents_executed": []
-            }
-        
-        elif task_type == "unclear":
-            return {
+        # Dispatch to the handler for this task type
+        handler = self._HANDLERS.get(task_type)
+        if handler is not None:
+            result = await handler(self, query, query_lower, files)
+        else:
+            result = {
                 "status": "error",
-                "summary": "I couldn't understand your request. Please provide more details.",
+                "summary": self._ERROR_SUMMARIES.get(task_type, "Unable to process request"),
                 "query": query,
                 "agents_executed": []
             }
         
-        elif task_type == "file_and_analyze":
-            # Process file first
-            file_result = await self.process_file(files)
-            if file_result["status"] == "error":
-                return {
-                    "status": "error",
-                    "summary": file_result["summary"],
-                    "query": query,
-                    "agents_executed": ["file"]
-                }
-            
-            # Then analyze the extracted text
-            analysis_result = await self.analyze_text(file_result["extracted_text"])
-            return {
-                "status": "completed",
-                "summary": f"{file_result['summary']}. {analysis_result['summary']}",
-                "query": query,
-                "agents_executed": ["file", "analysis"]
-            }
-        
-        elif task_type == "research":
-            # Do research
-            research_result = await self.research_topic(query)
-            
-            # If they want a report, add analysis
-            if "report" in query.lower() or "analysis" in query.lower():
-                findings_text = "\n".join(research_result.get("findings", []))
-                analysis_result = await self.analyze_text(f"{query}\n\nFindings:\n{findings_text}")
-                return {
-                    "status": "completed",
-                    "summary": f"{research_result['summary']}. Created analysis report.",
-                    "query": query,
-                    "agents_executed": ["research", "analysis"]
-                }
-            
-            return {
-                "status": "completed",
-                "summary": research_result["summary"],
-                "query": query,
-                "agents_executed": ["research"]
-            }
-        
-        elif task_type == "analyze":
-            # Direct text analysis
-            analysis_result = await self.analyze_text(query)
-            return {
-                "status": "completed",
-                "summary": analysis_result["summary"],
-                "query": query,
-                "agents_executed": ["analysis"]
-            }
-        
-        # Fallback
-        return {
-            "status": "error",
-            "summary": "Unable to process request",
-            "query": query,
-            "agents_executed": []
-        }
+        event = RouteEvent(
+            task_type,
+            tuple(result["agents_executed"]),
+            result["status"],
+            cache_hit,
+            routed - started,
+            time.perf_counter_ns() - started
+        )
+        self._route_events.append(event)
+        logger.debug("route %s agents=%s status=%s cache_hit=%s route_ns=%d latency_ns=%d", *event)
+        return result
 
 
 # Testing
@@ -0,0 +1,33 @@
+import io
+import threading
+from functools import lru_cache
+
+# PDFium is not thread-safe: calls from different threads must not overlap,
+# even on different documents. Each worker process has its own copy.
+_PDFIUM_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _pdfium():
+    # PDFium is loaded on the first parse, not at import; None when not installed
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    return pypdfium2
+
+
+def extract_pdf(content: bytes) -> tuple:
+    """Text of every page and the page count, via PDFium (PyPDF2 if pypdfium2 is missing)"""
+    pdfium = _pdfium()
+    if pdfium is not None:
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(content)
+            try:
+                pages = [page.get_textpage().get_text_range() for page in pdf]
+            finally:
+                pdf.close()
+    else:
+        import PyPDF2  # pure-Python fallback, only loaded when pypdfium2 is missing
+        pages = [page.extract_text() for page in PyPDF2.PdfReader(io.BytesIO(content)).pages]
+    return "\n".join(pages) + "\n", len(pages)